@@ -13,12 +13,20 @@
 #  Initial version
 #
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
 import argparse
+import json
+import os
+import pickle
 import re
+import sqlite3
 import subprocess
 import sys
 import textwrap
+import threading
+import time
 try:
     from yattag import Doc
 except:
@@ -33,6 +41,8 @@ except:
 try:
     from jira import JIRA
     from jira.exceptions import JIRAError
+    from jira.resources import dict2resource
+    from requests import RequestException
 except:
     print(textwrap.dedent('''
     Unable to load jira library needed for JIRA information.
@@ -51,29 +61,274 @@ VERSION = '1.0'
 # Connection defaults
 JIRA_URL = 'https://jira.corp.synacor.com'
 DEFAULT_TIMEOUT = 10
+DEFAULT_JIRA_TTL = 24 * 60 * 60  # seconds
+JIRA_SEARCH_SIZE = 50
+BUG_ID_PATTERN = re.compile(r'[a-zA-Z][a-zA-Z][a-zA-Z]+-[0-9]+')
+BUG_FILE_SEPARATORS = re.compile(r'[,;|\t]')
+# Cache defaults
+CACHE_FILE = 'bug_review.cache'
+JIRA_CACHE_FILE = 'bug_review.jira'
+DEFAULT_CACHE_SIZE = 256  # megabytes
+INDEX_FILE = 'bug_review.index'
+ORIGINS_FILE = 'bug_review.origins'
+DEFAULT_TOP_LIMIT = 20
+
+
+class GitProcesses:
+    'Start git subprocesses and count how many a run used.'
+    count = 0
+    lock = threading.Lock()
+
+    def _started():
+        with GitProcesses.lock:
+            GitProcesses.count += 1
+
+    def run(cmd, **kwargs):
+        GitProcesses._started()
+        return subprocess.run(cmd, **kwargs)
+
+    def popen(cmd, **kwargs):
+        GitProcesses._started()
+        return subprocess.Popen(cmd, **kwargs)
+
+    def getSummary():
+        return 'git processes: {}'.format(GitProcesses.count)
+
+
+class GitObjects:
+    '''Read git objects through one long running `git cat-file --batch`.
+
+    The shared instance is started on first use and kept open for the whole
+    run so objects can be read without forking git again.
+    '''
+    shared_instance = None
+
+    def __init__(self):
+        self.proc = None
+        self.lock = threading.Lock()
+
+    def shared():
+        'Return the reader shared by the whole run.'
+        if GitObjects.shared_instance is None:
+            GitObjects.shared_instance = GitObjects()
+        return GitObjects.shared_instance
+
+    def read(self, name):
+        '''Return (sha, type, data) for an object, or None if it is missing.
+
+        name can be anything git understands as an object name.
+        '''
+        with self.lock:
+            if self.proc is None:
+                self.proc = GitProcesses.popen(['git', 'cat-file', '--batch',
+                                                '--use-mailmap'],
+                                               stdin=subprocess.PIPE,
+                                               stdout=subprocess.PIPE)
+            self.proc.stdin.write(name.encode('utf-8') + b'\n')
+            self.proc.stdin.flush()
+            header = self.proc.stdout.readline().split()
+            if len(header) != 3:
+                return None
+            data = self.proc.stdout.read(int(header[2]))
+            self.proc.stdout.read(1)
+        return (str(header[0], 'ascii'), str(header[1], 'ascii'), data)
+
+    def close(self):
+        if self.proc:
+            self.proc.stdin.close()
+            self.proc.wait()
+            self.proc = None
+
+
+def gitDir():
+    'Return the path of the .git directory of the current repository.'
+    gitdir = GitProcesses.run(['git', 'rev-parse', '--git-dir'],
+                              stdout=subprocess.PIPE,
+                              stderr=subprocess.PIPE)
+    if gitdir.returncode != 0:
+        gitFailed('Not in a git repository.', gitdir)
+    return str(gitdir.stdout, 'utf-8').strip()
+
+
+def gitFailed(message, result):
+    'Report a git command which failed, with what git said, and exit.'
+    sys.stderr.write(textwrap.dedent('''
+    {}
+
+    git responded with:
+    {}
+    ''').format(message, str(result.stderr, 'utf-8', 'replace').strip()))
+    sys.exit(1)
+
+
+def readRecords(stream, size):
+    '''Split a stream of NUL terminated fields into records of size fields.
+
+    This reads the `-z` output of git commands as it is produced.
+    '''
+    fields = []
+    pending = b''
+    for chunk in iter(lambda: stream.read(65536), b''):
+        parts = (pending + chunk).split(b'\0')
+        pending = parts.pop()
+        for part in parts:
+            fields.append(str(part, 'utf-8', 'replace'))
+            if len(fields) == size:
+                yield fields
+                fields = []
+
+
+class ReportCache:
+    '''Persistent cache of parsed git results.
+
+    Commits never change, so the parsed content of GitDiff, GitBlame and
+    GitMeta is stored in a SQLite database inside the .git directory, keyed
+    by the kind of content and the commit (plus any options that shape the
+    result).  The least recently used entries are evicted once the total
+    size grows beyond max_size bytes.  The cache may be shared by threads.
+    '''
+
+    def __init__(self, path=None, max_size=DEFAULT_CACHE_SIZE * 1024 * 1024,
+                 enabled=True, rebuild=False):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        self.lock = threading.Lock()
+        if enabled:
+            if not path:
+                path = os.path.join(gitDir(), CACHE_FILE)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute('''CREATE TABLE IF NOT EXISTS entries (
+                                 kind TEXT NOT NULL,
+                                 key TEXT NOT NULL,
+                                 value BLOB NOT NULL,
+                                 size INTEGER NOT NULL,
+                                 used REAL NOT NULL,
+                                 PRIMARY KEY (kind, key))''')
+            if rebuild:
+                self.db.execute('DELETE FROM entries')
+
+    def get(self, kind, key):
+        'Return the cached content or None when it is not available.'
+        with self.lock:
+            row = None
+            if self.db:
+                row = self.db.execute('SELECT value FROM entries '
+                                      'WHERE kind = ? AND key = ?',
+                                      (kind, key)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.db.execute('UPDATE entries SET used = ? '
+                            'WHERE kind = ? AND key = ?',
+                            (time.time(), kind, key))
+        return pickle.loads(row[0])
+
+    def put(self, kind, key, content):
+        'Store content in the cache.'
+        if self.db:
+            value = pickle.dumps(content, pickle.HIGHEST_PROTOCOL)
+            with self.lock:
+                self.db.execute('INSERT OR REPLACE INTO entries '
+                                '(kind, key, value, size, used) '
+                                'VALUES (?, ?, ?, ?, ?)',
+                                (kind, key, value, len(value), time.time()))
+
+    def evict(self):
+        'Drop least recently used entries until the cache fits max_size.'
+        if not self.db:
+            return
+        total = self.db.execute('SELECT TOTAL(size) '
+                                'FROM entries').fetchone()[0]
+        if total <= self.max_size:
+            return
+        rows = self.db.execute('SELECT kind, key, size FROM entries '
+                               'ORDER BY used').fetchall()
+        for kind, key, size in rows:
+            if total <= self.max_size:
+                break
+            self.db.execute('DELETE FROM entries WHERE kind = ? AND key = ?',
+                            (kind, key))
+            total -= size
+
+    def close(self):
+        'Evict as needed and write the cache to disk.'
+        if self.db:
+            self.evict()
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def getSummary(self):
+        return 'cache: {} hits, {} misses'.format(self.hits, self.misses)
 
 
 class GitLog:
     'Wrapper for Git Log content'
+    log_format = '%H%x00%s%x00%B'
+    bug_pattern = re.compile(r'\b[a-zA-Z][a-zA-Z][a-zA-Z]+-[0-9]+\b')
 
-    def __init__(self, bugId=None):
-        if bugId:
-            self.bug = bugId
+    def __init__(self, bugId=None, content=None):
+        self.bug = bugId
+        self.content = content
+        if content is None:
             self.raw_content = GitLog._load_content_for_bug(self.bug)
-
-        if self.raw_content:
             self.content = GitLog._parse_entries(self.raw_content)
 
-    def logBug(bugId):
+    def logBug(bugId, index=None):
+        if index:
+            return GitLog(bugId, index.lookup(bugId))
         return GitLog(bugId=bugId)
 
+    def logBugs(bugIds, index=None):
+        '''Return a GitLog for each bug while walking the history only once.
+
+        Every commit message is scanned for bug IDs and the commits are
+        indexed by the IDs found, so only exact IDs match.  With a BugIndex
+        the history is not walked at all.
+        '''
+        if index:
+            return {bugId: GitLog.logBug(bugId, index) for bugId in bugIds}
+        wanted = {}
+        for bugId in bugIds:
+            wanted[bugId.upper()] = []
+        cmd = ['git', 'log',
+               '--no-merges',
+               '-z',
+               '--format=' + GitLog.log_format]
+        proc = GitProcesses.popen(cmd, stdout=subprocess.PIPE)
+        for commit, subject, body in readRecords(proc.stdout, 3):
+            entry = None
+            for found in GitLog.findBugIds(body):
+                if found in wanted:
+                    if entry is None:
+                        entry = GitLog._entry(commit, subject)
+                    wanted[found].append(entry)
+        proc.wait()
+        result = {}
+        for bugId in bugIds:
+            result[bugId] = GitLog(bugId, wanted[bugId.upper()])
+        return result
+
+    def findBugIds(message):
+        'Return the set of bug IDs, in upper case, mentioned in a message.'
+        return set(GitLog.bug_pattern.findall(message.upper()))
+
+    def _entry(commit, message):
+        return {'commit': commit,
+                'message': message,
+                'bug': GitLog._parse_bug_id(message)}
+
     def _load_content_for_bug(bugId):
         cmd = ["git", "log",
                "--no-merges",
-               "--oneline",
-               "--grep=%s" % bugId]
-        logcontent = subprocess.run(cmd,
-                                    stdout=subprocess.PIPE)
+               "--format=%H %s",
+               "--extended-regexp",
+               "--grep=(^|[^[:alnum:]])%s([^[:digit:]]|$)" % bugId]
+        logcontent = GitProcesses.run(cmd,
+                                      stdout=subprocess.PIPE)
         return str(logcontent.stdout, 'utf-8').split('\n')
 
     def _parse_bug_id(message):
@@ -85,11 +340,8 @@ class GitLog:
         return None
 
     def _parse_single_entry(entry):
-        result = {}
-        result['commit'] = entry[0:10]
-        result['message'] = entry[11:]
-        result['bug'] = GitLog._parse_bug_id(result['message'])
-        return result
+        commit, _, message = entry.partition(' ')
+        return GitLog._entry(commit, message)
 
     def _parse_entries(loglines):
         result = []
@@ -109,159 +361,351 @@ class GitLog:
         return self.content
 
 
+class BugIndex:
+    '''Persistent index of bug IDs to the commits which mention them.
+
+    The index is a SQLite database inside the .git directory.  For every ref
+    it records the tip that was last indexed, so an update only scans the
+    commits added since.  If a ref was rewritten the entries of that ref are
+    rebuilt.
+    '''
+
+    def __init__(self, path=None):
+        if not path:
+            path = os.path.join(gitDir(), INDEX_FILE)
+        self.db = sqlite3.connect(path)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS tips (
+                             ref TEXT PRIMARY KEY,
+                             tip TEXT NOT NULL)''')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS commits (
+                             ref TEXT NOT NULL,
+                             bug TEXT NOT NULL,
+                             seq INTEGER NOT NULL,
+                             commit_id TEXT NOT NULL,
+                             message TEXT NOT NULL)''')
+        self.db.execute('''CREATE INDEX IF NOT EXISTS commits_bug
+                           ON commits (ref, bug)''')
+        self.ref = None
+
+    def update(self, ref='HEAD'):
+        '''Bring the index of ref up to date with its current tip.
+
+        The following lookups are answered for this ref.
+        '''
+        names = GitProcesses.run(['git', 'rev-parse', ref,
+                                  '--symbolic-full-name', ref],
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.PIPE)
+        if names.returncode != 0:
+            gitFailed('Can not index the bug IDs of {}; it has no commits '
+                      'yet or is not a valid ref.'.format(ref), names)
+        tip, name = str(names.stdout, 'utf-8').split('\n')[:2]
+        self.ref = name or ref
+        row = self.db.execute('SELECT tip FROM tips WHERE ref = ?',
+                              (self.ref,)).fetchone()
+        last = row[0] if row else None
+        if last == tip:
+            return
+        revisions = [tip]
+        if last and BugIndex._is_ancestor(last, tip):
+            revisions.append('^' + last)
+        else:
+            self.db.execute('DELETE FROM commits WHERE ref = ?', (self.ref,))
+        start = self.db.execute('SELECT MAX(seq) FROM commits WHERE ref = ?',
+                                (self.ref,)).fetchone()[0] or 0
+        cmd = ['git', 'log',
+               '--no-merges',
+               '-z',
+               '--format=' + GitLog.log_format] + revisions
+        proc = GitProcesses.popen(cmd, stdout=subprocess.PIPE)
+        found = []
+        count = 0
+        for commit, subject, body in readRecords(proc.stdout, 3):
+            count += 1
+            for bugId in GitLog.findBugIds(body):
+                found.append((bugId, count, commit, subject))
+        proc.wait()
+        # git lists the newest commits first, so number them backwards
+        self.db.executemany('INSERT INTO commits '
+                            '(ref, bug, seq, commit_id, message) '
+                            'VALUES (?, ?, ?, ?, ?)',
+                            [(self.ref, bugId, start + count + 1 - position,
+                              commit, subject)
+                             for bugId, position, commit, subject in found])
+        self.db.execute('INSERT OR REPLACE INTO tips (ref, tip) VALUES (?, ?)',
+                        (self.ref, tip))
+        self.db.commit()
+
+    def _is_ancestor(commit, tip):
+        result = GitProcesses.run(['git', 'merge-base', '--is-ancestor',
+                                   commit, tip])
+        return result.returncode == 0
+
+    def lookup(self, bugId):
+        'Return the log entries of a bug, newest first.'
+        if self.ref is None:
+            self.update()
+        rows = self.db.execute('SELECT commit_id, message FROM commits '
+                               'WHERE ref = ? AND bug = ? ORDER BY seq DESC',
+                               (self.ref, bugId.upper())).fetchall()
+        return [GitLog._entry(commit, message) for commit, message in rows]
+
+    def close(self):
+        self.db.close()
+
+
 class GitMeta:
     'Metadata for a commit'
+    author_pattern = re.compile(r'^author (.*) <(.*)> ([0-9]+) ([-+][0-9]+)$')
+    bug_pattern = r'^\s*([a-zA-Z][a-zA-Z][a-zA-Z]+-[0-9]+).*$'
+    cache_kind = 'meta-1'
 
-    def __init__(self, commit):
+    def __init__(self, commit, content=None, cache=None):
         self.commit = commit
-        self.raw_content = GitMeta._load_content(self.commit)
-        self.content = GitMeta._parse_content(self.raw_content)
-
-    def _load_content(commit):
-        if commit:
-            metacontent = subprocess.run(['git', 'log',
-                                          commit + '^!'],
-                                         stdout=subprocess.PIPE)
-            return str(metacontent.stdout, 'utf-8').split('\n')
-        return None
+        if content is None:
+            content = GitMeta.loadBatch([commit], cache)[commit]
+        self.content = content
 
-    def _parse_content(content):
-        result = {'bug': [], 'notes': []}
-        commit_pattern = r'^commit (.*)$'
-        date_pattern = r'^Date:\s*(.*)$'
-        author_pattern = r'^Author:\s*(.*) (<.*>)$'
-        bug_pattern = r'^\s*([a-zA-Z][a-zA-Z][a-zA-Z]+-[0-9]+).*$'
-        consume_notes = True
-        if content:
-            for line in content:
-                match = re.match(commit_pattern, line, re.M)
-                if match:
-                    result['commit'] = match.group(1)
+    def loadBatch(commits, cache=None):
+        '''Load metadata for a set of commits.
+
+        Commit objects missing from the cache are read through the shared
+        GitObjects reader.  Returns a dictionary of parsed content keyed by
+        the commit names passed in.  Commits which can not be found get
+        empty content.
+        '''
+        objects = GitObjects.shared()
+        result = {}
+        for commit in commits:
+            if not commit or commit in result:
+                continue
+            content = None
+            if cache:
+                content = cache.get(GitMeta.cache_kind, commit)
+            if content is None:
+                found = objects.read(commit)
+                if found and found[1] == 'commit':
+                    content = GitMeta._parse_commit(found[0], found[2])
+                    if cache:
+                        cache.put(GitMeta.cache_kind, commit, content)
                 else:
-                    match = re.match(date_pattern, line, re.M)
-                    if match:
-                        result['date'] = datetime.strptime(
-                            match.group(1),
-                            '%a %b %d %H:%M:%S %Y %z')
-                    else:
-                        match = re.match(author_pattern, line, re.M)
-                        if match:
-                            result['author'] = match.group(1)
-                            result['email'] = match.group(2)
-                        else:
-                            if consume_notes:
-                                if line[0:4] == 'diff':
-                                    consume_notes = False
-                                else:
-                                    result['notes'].append(line)
-                                    match = re.match(bug_pattern,
-                                                     line, re.M | re.I)
-                                    if match:
-                                        if match.group(1) not in result['bug']:
-                                            result['bug'].append(match.group(1))
+                    content = GitMeta._parse_commit(None, None)
+            result[commit] = content
+        return result
+
+    def _parse_commit(sha, data):
+        '''Turn a raw commit object into commit metadata.
+
+        Notes are laid out the way `git log` prints a commit message so the
+        report can rely on the title being the second entry.
+        '''
+        result = {'bug': [], 'notes': []}
+        if data is None:
+            return result
+        header, _, message = str(data, 'utf-8', 'replace').partition('\n\n')
+        result['commit'] = sha
+        for line in header.split('\n'):
+            match = GitMeta.author_pattern.match(line)
+            if match:
+                tz = datetime.strptime(match.group(4), '%z').tzinfo
+                result['author'] = match.group(1)
+                result['email'] = '<{}>'.format(match.group(2))
+                result['date'] = datetime.fromtimestamp(int(match.group(3)),
+                                                        tz)
+        result['notes'].append('')
+        for line in message.rstrip('\n').split('\n'):
+            note = '    ' + line
+            result['notes'].append(note)
+            match = re.match(GitMeta.bug_pattern, note, re.M | re.I)
+            if match:
+                if match.group(1) not in result['bug']:
+                    result['bug'].append(match.group(1))
+        result['notes'].append('')
         return result
 
     def getContent(self):
         return self.content
 
 
+class DiffLine:
+    '''A single line of a diff.
+
+    kind is one of:
+    - '@' for a hunk header
+    - '=' for a line present on both sides
+    - '-' and '+' for lines only present on the left or right side
+    - 'header' for the diff, index, mode and ---/+++ lines of a file
+    - 'rename', 'binary' and 'nonewline' for the matching git markers
+    '''
+    __slots__ = ('kind', 'old_no', 'new_no', 'text')
+
+    def __init__(self, kind, old_no, new_no, text):
+        self.kind = kind
+        self.old_no = old_no
+        self.new_no = new_no
+        self.text = text
+
+    def __repr__(self):
+        return 'DiffLine({!r}, {!r}, {!r}, {!r})'.format(self.kind,
+                                                         self.old_no,
+                                                         self.new_no,
+                                                         self.text)
+
+
 class GitDiff:
     'Diff information for a commit without the use of additional tools.'
-    lines_pattern = r'^@@ -([0-9]+),[0-9]+ [+]([0-9]+),[0-9]+ @@'
-    diff_pattern = r'^diff --git a/([^ ]*) b/(.*)$'
-    unparsed_pattern = r'^(---|\+\+\+|[^-+ ])'
-    sub_pattern = r'^-'
-    add_pattern = r'^[+]'
-    file_match = r'^[+][+][+] b/(.*)$'
-    line_match = r'^[+]([0-9]*):.*$'
-    summary_match = r'^[+]([0-9]*):(.*)$'
-
-    def __init__(self, commit):
+    lines_pattern = re.compile(r'^@@ -([0-9]+)(?:,[0-9]+)? '
+                               r'[+]([0-9]+)(?:,[0-9]+)? @@')
+    path_prefixes = (('+++ ', 'new'), ('--- ', 'old'),
+                     ('rename to ', 'renamed'), ('copy to ', 'renamed'))
+    quoted_escapes = {'a': 7, 'b': 8, 't': 9, 'n': 10, 'v': 11, 'f': 12,
+                      'r': 13}
+    hunk_prefixes = (' ', '-', '+', '\\')
+    marker_prefixes = (('rename ', 'rename'),
+                       ('copy ', 'rename'),
+                       ('Binary files ', 'binary'))
+    diff_options = ['-w', '--ignore-all-space', '--ignore-blank-lines']
+    cache_kind = 'diff-3'
+
+    def __init__(self, commit, cache=None):
         self.commit = commit
         self.prev_commit = commit + '^'
-        self.raw_content = GitDiff._load_content(self.commit,
+        self.content = None
+        if cache:
+            self.content = cache.get(GitDiff.cache_kind,
+                                     GitDiff.cacheKey(commit))
+        if self.content is None:
+            self.content = GitDiff._load_content(self.commit,
                                                  self.prev_commit)
-        self.content = GitDiff._rewrite_diff(self.raw_content)
+            if cache:
+                cache.put(GitDiff.cache_kind, GitDiff.cacheKey(commit),
+                          self.content)
+
+    def cacheKey(commit):
+        'Cache key for the results derived from the diff of a commit.'
+        return ' '.join([commit] + GitDiff.diff_options)
+
+    def _parse_diff(lines):
+        '''Parse the lines of a diff as they are read.
 
-    def _rewrite_diff(raw_diff):
+        Yields a (filename, records) tuple for each file of the diff, where
+        records is a list of DiffLine.
+        '''
         left = 0
         right = 0
-        lines = []
-        files = {}
-        current_filename = ''
-        current_sectionname = ''
-        current_file = []
-        current_section = {}
-        for line in raw_diff:
-            match = re.match(GitDiff.lines_pattern, line, re.M)
-            if match:
-                current_section = []
-                current_sectionname = line
-                left = int(match.group(1))
-                right = int(match.group(2))
-                current_file.append(('@', None, line))
-            else:
-                match = re.match(GitDiff.unparsed_pattern, line, re.M)
-                if match:
-                    if line[0:3] == 'dif':
-                        if current_section:
-                            current_file.append((current_sectionname,
-                                                 current_section))
-                        if current_file:
-                            files[current_filename] = current_file
-                        match = re.match(GitDiff.diff_pattern, line, re.M)
-                        if match:
-                            current_filename = match.group(2)
-                            current_file = []
-                            current_file.append(('diff', None, line))
-                    else:
-                        current_file.append((match.group(1), None, line))
-                    lines.append((None, None, line))
+        names = None
+        records = []
+        in_hunk = False
+        for line in lines:
+            prefix = line[:1]
+            if in_hunk and prefix in GitDiff.hunk_prefixes:
+                if prefix == ' ':
+                    records.append(DiffLine('=', left, right, line[1:]))
+                    left += 1
+                    right += 1
+                elif prefix == '-':
+                    records.append(DiffLine('-', left, None, line[1:]))
+                    left += 1
+                elif prefix == '+':
+                    records.append(DiffLine('+', None, right, line[1:]))
+                    right += 1
                 else:
-                    match = re.match(GitDiff.sub_pattern, line, re.M)
-                    if match:
-                        current_file.append(('-', left, ' ' + line[1:]))
-                        lines.append(('-', left, line[1:]))
-                        left += 1
-                    else:
-                        match = re.match(GitDiff.add_pattern, line, re.M)
-                        if match:
-                            current_file.append(('+', right, ' ' + line[1:]))
-                            lines.append(('+', right, line[1:]))
-                            right += 1
-                        else:
-                            current_file.append(('=', (left, right), line))
-                            lines.append(('=', (left, right), line))
-                            left += 1
-                            right += 1
-        if current_section:
-            current_file.append((current_sectionname, current_section))
-        if current_file:
-            files[current_filename] = current_file
-        return files
+                    records.append(DiffLine('nonewline', None, None, line))
+            elif prefix == '@':
+                match = GitDiff.lines_pattern.match(line)
+                if match:
+                    left = int(match.group(1))
+                    right = int(match.group(2))
+                in_hunk = True
+                records.append(DiffLine('@', None, None, line))
+            elif line.startswith('diff '):
+                if names is not None:
+                    yield (GitDiff._filename(names), records)
+                names = {'header': line}
+                records = [DiffLine('header', None, None, line)]
+                in_hunk = False
+            elif line:
+                kind = 'header'
+                for marker, marker_kind in GitDiff.marker_prefixes:
+                    if line.startswith(marker):
+                        kind = marker_kind
+                for marker, name in GitDiff.path_prefixes:
+                    if names is not None and line.startswith(marker):
+                        names[name] = line[len(marker):]
+                records.append(DiffLine(kind, None, None, line))
+        if names is not None:
+            yield (GitDiff._filename(names), records)
+
+    def _filename(names):
+        '''Return the path a file of the diff has in the right side commit.
+
+        The path is taken from the `+++` line, or the `rename to` or `---`
+        line when the file does not exist on that side.  Binary files and
+        mode changes have none of these, and `diff --git` only names them
+        unambiguously when both sides are the same path.
+        '''
+        for name in ('new', 'renamed', 'old'):
+            path = names.get(name)
+            if path and path != '/dev/null':
+                # git adds a tab after unquoted names containing spaces
+                path = GitDiff._unquote(path.rstrip('\t'))
+                if name != 'renamed':
+                    path = path[2:]
+                return path
+        header = names['header'][len('diff --git '):]
+        half = len(header) // 2
+        left, right = header[:half], header[half + 1:]
+        if header[half:half + 1] == ' ' and \
+                left.replace('a/', 'b/', 1) == right:
+            return GitDiff._unquote(right.replace('b/', '', 1))
+        return header
+
+    def _unquote(path):
+        'Undo the C style quoting git applies to unusual path names.'
+        if not path.startswith('"'):
+            return path
+        result = bytearray()
+        i = 1
+        while i < len(path) - 1:
+            char = path[i]
+            if char == '\\':
+                char = path[i + 1]
+                if char in '01234567':
+                    result.append(int(path[i + 1:i + 4], 8))
+                    i += 4
+                    continue
+                result.append(GitDiff.quoted_escapes.get(char, ord(char)))
+                i += 2
+                continue
+            result.extend(char.encode('utf-8'))
+            i += 1
+        return str(bytes(result), 'utf-8', 'replace')
 
     def _load_content(commit, prev_commit):
-        raw_diff = subprocess.run(['git', 'diff',
-                                   '-w', '--ignore-all-space',
-                                   '--ignore-blank-lines',
-                                   commit, prev_commit],
+        proc = GitProcesses.popen(['git', 'diff'] +
+                                  GitDiff.diff_options +
+                                  [commit, prev_commit],
                                   stdout=subprocess.PIPE)
-        return str(raw_diff.stdout, 'utf-8').split('\n')
+        lines = (str(line, 'utf-8', 'replace').rstrip('\n')
+                 for line in proc.stdout)
+        files = dict(GitDiff._parse_diff(lines))
+        proc.wait()
+        return files
 
     def _composeLine(line):
-        'turn a diff tuple into a line.'
+        'turn a DiffLine into a line.'
         result = ''
         if line:
-            if line[0] is None:
-                result = line[2]
-            elif line[0] == '-' or line[0] == '+':
-                result = '{0}{1}:{2}'.format(line[0],
-                                             line[1],
-                                             line[2])
-            elif line[0] == '=':
-                result = '({0},{1}):{2}'.format(line[1][0],
-                                                line[1][1],
-                                                line[2])
+            if line.kind == '-':
+                result = '-{0}: {1}'.format(line.old_no, line.text)
+            elif line.kind == '+':
+                result = '+{0}: {1}'.format(line.new_no, line.text)
+            elif line.kind == '=':
+                result = '({0},{1}): {2}'.format(line.old_no,
+                                                 line.new_no,
+                                                 line.text)
+            else:
+                result = line.text
         return result
 
     def getContent(self):
@@ -270,60 +714,137 @@ class GitDiff:
 
 class GitBlame:
     'Blame information for a commit'
-    blame_pattern = r'^([a-f0-9]*)[^\(]*\(([^0-9]+) ([0-9]+-[0-9]+-[0-9]+ [0-9]+:[0-9]+:[0-9]+ [^ ]+)[^0-9]+([0-9]+).*$'
+    header_pattern = re.compile(r'^([0-9a-f]{40,64}) ([0-9]+) ([0-9]+)')
+    cache_kind = 'blame-3'
 
-    def __init__(self, commit, diff):
+    def __init__(self, commit, diff, cache=None, content=None):
         self.commit = commit
         self.diff = diff
-        self.raw_content = GitBlame._load_content(self.commit, self.diff)
-        self.content = GitBlame._parse_content(self.raw_content)
+        if content is None and cache:
+            content = cache.get(GitBlame.cache_kind, GitDiff.cacheKey(commit))
+        if content is None:
+            content = GitBlame._load_content(self.commit, self.diff)
+            if cache:
+                cache.put(GitBlame.cache_kind, GitDiff.cacheKey(commit),
+                          content)
+        self.content = content
+
+    def loadBatch(entries, cache=None, executor=None):
+        '''Blame the diffs of several commits.
+
+        entries is a list of (commit, diff content) tuples and a GitBlame is
+        returned for each of them in the same order.  When an executor is
+        given, the files of every commit missing from the cache are blamed
+        concurrently on it.
+        '''
+        loaded = []
+        for commit, diff in entries:
+            content = None
+            if cache:
+                content = cache.get(GitBlame.cache_kind,
+                                    GitDiff.cacheKey(commit))
+            missed = content is None
+            if missed:
+                content = {}
+                headers = {}
+                for filename, ranges in GitBlame._file_ranges(diff):
+                    if executor:
+                        content[filename] = executor.submit(
+                            GitBlame._blame_file, commit, filename, ranges, {})
+                    else:
+                        content[filename] = GitBlame._blame_file(
+                            commit, filename, ranges, headers)
+            loaded.append((commit, diff, content, missed))
+        result = []
+        for commit, diff, content, missed in loaded:
+            if missed:
+                if executor:
+                    for filename in content:
+                        content[filename] = content[filename].result()
+                if cache:
+                    cache.put(GitBlame.cache_kind, GitDiff.cacheKey(commit),
+                              content)
+            result.append(GitBlame(commit, diff, content=content))
+        return result
 
-    def _load_content(commit, diff):
-        files = {}
+    def _line_ranges(lines):
+        'Collapse line numbers into a list of contiguous (start, end) ranges.'
+        ranges = []
+        for line in sorted(set(lines)):
+            if ranges and ranges[-1][1] + 1 == line:
+                ranges[-1] = (ranges[-1][0], line)
+            else:
+                ranges.append((line, line))
+        return ranges
+
+    def _file_ranges(diff):
+        'Yield the ranges of lines to blame for each file of a diff.'
         if diff:
             for filename in diff:
-                lines = list(filter(lambda x: x is not None and
-                                    not isinstance(x, tuple),
-                                    map(lambda y: y[1],
-                                        list(filter(lambda z: z[0] == '+',
-                                                    diff[filename])))))
-
-                if lines:
-                    cmdline = []
-                    cmdline.append("git")
-                    cmdline.append("blame")
-                    for line in lines:
-                        cmdline.append("-L %s,%s" % (line, line))
-                    cmdline.append((commit + '^'))
-                    cmdline.append("--")
-                    cmdline.append(filename)
-                    blamecontent = subprocess.run(cmdline,
-                                                  stdout=subprocess.PIPE)
-                    files[filename] = (str(blamecontent.stdout,
-                                           'utf-8').split('\n'))
+                lines = [item.new_no for item in diff[filename]
+                         if item.kind == '+']
+                ranges = GitBlame._line_ranges(lines)
+                if ranges:
+                    yield (filename, ranges)
 
-        return files
-
-    def _parse_content(raw):
+    def _load_content(commit, diff):
         files = {}
-        if raw:
-            for filename in raw:
-                result = {}
-                for item in raw[filename]:
-                    match = re.match(GitBlame.blame_pattern, item, re.M)
-                    if match:
-                        result[match.group(4)] = ({'commit': match.group(1),
-                                                   'author': match.group(2).rstrip(),
-                                                   'date': match.group(3),
-                                                   'line': match.group(4)})
-                    else:
-                        if item:
-                            print('!'*30)
-                            print('ERROR in MATCH {}'.format(item))
-                            print('!'*30)
-                files[filename] = result
+        headers = {}
+        for filename, ranges in GitBlame._file_ranges(diff):
+            files[filename] = GitBlame._blame_file(commit, filename,
+                                                   ranges, headers)
         return files
 
+    def _blame_file(commit, filename, ranges, headers):
+        cmdline = ['git', 'blame', '--porcelain']
+        for first, last in ranges:
+            cmdline.append('-L')
+            cmdline.append('%s,%s' % (first, last))
+        cmdline.append((commit + '^'))
+        cmdline.append('--')
+        cmdline.append(filename)
+        proc = GitProcesses.popen(cmdline, stdout=subprocess.PIPE)
+        result = GitBlame._parse_content(proc.stdout, headers)
+        proc.wait()
+        return result
+
+    def _parse_content(stream, headers):
+        '''Parse `git blame --porcelain` output as it is produced.
+
+        git only prints the headers of a commit the first time it is seen, so
+        they are kept in headers (keyed by SHA) for the following lines.
+        '''
+        result = {}
+        current = None
+        for raw in stream:
+            item = str(raw, 'utf-8', 'replace').rstrip('\n')
+            if item.startswith('\t'):
+                continue
+            match = GitBlame.header_pattern.match(item)
+            if match:
+                current = headers.setdefault(match.group(1), {})
+                line = match.group(3)
+                result[line] = {'commit': match.group(1),
+                                'header': current,
+                                'line': line}
+            elif current is not None:
+                key, _, value = item.partition(' ')
+                current[key] = value
+        for line in result:
+            header = result[line].pop('header')
+            result[line]['author'] = header.get('author', '')
+            result[line]['date'] = GitBlame._format_date(
+                header.get('author-time'),
+                header.get('author-tz'))
+        return result
+
+    def _format_date(timestamp, tz):
+        if not timestamp or not tz:
+            return ''
+        date = datetime.fromtimestamp(int(timestamp),
+                                      datetime.strptime(tz, '%z').tzinfo)
+        return date.strftime('%Y-%m-%d %H:%M:%S %z')
+
     def getContent(self):
         return self.content
 
@@ -335,6 +856,104 @@ class GitBlame:
         return authors
 
 
+class JiraCacheMiss(Exception):
+    'An issue is needed which is not in the local JIRA cache.'
+
+
+class JiraIssues:
+    '''JIRA issues with a local cache of their JSON.
+
+    Issues are kept for ttl seconds in a SQLite database of their own inside
+    the .git directory, apart from the ReportCache: they are not evicted
+    with the git results nor discarded by --rebuild-cache, and have their
+    own hit and miss counters.  They are fetched on a background thread, so
+    the request overlaps with the git analysis.  The one JIRA client, and
+    with it its HTTP session, is reused for all requests.  Without a client
+    only cached issues can be used.
+    '''
+
+    def __init__(self, jira, path=None, ttl=DEFAULT_JIRA_TTL, enabled=True):
+        self.jira = jira
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.db = None
+        self.lock = threading.Lock()
+        if enabled:
+            if not path:
+                path = os.path.join(gitDir(), JIRA_CACHE_FILE)
+            self.db = sqlite3.connect(path, check_same_thread=False)
+            self.db.execute('''CREATE TABLE IF NOT EXISTS issues (
+                                 key TEXT PRIMARY KEY,
+                                 fetched REAL NOT NULL,
+                                 value TEXT NOT NULL)''')
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def fetch(self, bugId):
+        'Start fetching an issue.  Returns a future of the issue.'
+        return self.executor.submit(self._load, bugId)
+
+    def prefetch(self, bugIds):
+        '''Fetch many issues with as few searches as possible.
+
+        Runs in the background; issues already cached are skipped.
+        '''
+        return self.executor.submit(self._search, bugIds)
+
+    def _cached(self, bugId):
+        with self.lock:
+            row = None
+            if self.db:
+                row = self.db.execute('SELECT fetched, value FROM issues '
+                                      'WHERE key = ?',
+                                      (bugId.upper(),)).fetchone()
+            if row and (not self.jira or time.time() - row[0] < self.ttl):
+                self.hits += 1
+                return json.loads(row[1])
+            self.misses += 1
+        return None
+
+    def _store(self, bugId, raw):
+        if self.db:
+            with self.lock:
+                self.db.execute('INSERT OR REPLACE INTO issues '
+                                '(key, fetched, value) VALUES (?, ?, ?)',
+                                (bugId.upper(), time.time(), json.dumps(raw)))
+
+    def _load(self, bugId):
+        raw = self._cached(bugId)
+        if raw is None:
+            if not self.jira:
+                raise JiraCacheMiss('{} is not in the local JIRA cache'
+                                    .format(bugId))
+            raw = self.jira.issue(bugId).raw
+            self._store(bugId, raw)
+        return dict2resource(raw)
+
+    def _search(self, bugIds):
+        if not self.jira:
+            return
+        missing = [b for b in bugIds if self._cached(b) is None]
+        for start in range(0, len(missing), JIRA_SEARCH_SIZE):
+            keys = missing[start:start + JIRA_SEARCH_SIZE]
+            found = self.jira.search_issues('key in ({})'.format(
+                                                ','.join(keys)),
+                                            maxResults=len(keys),
+                                            validate_query=False)
+            for issue in found:
+                self._store(issue.key, issue.raw)
+
+    def close(self):
+        self.executor.shutdown()
+        if self.db:
+            self.db.commit()
+            self.db.close()
+            self.db = None
+
+    def getSummary(self):
+        return 'jira cache: {} hits, {} misses'.format(self.hits, self.misses)
+
+
 def reportCSS():
     'Returns CSS style for use in report.'
     doc, tag, text = Doc().tagtext()
@@ -746,28 +1365,30 @@ def reportHeader(bugId, issue):
     return doc.getvalue()
 
 
-def htmlReport(bugId, head, content):
-    'Generate an HTML report.'
+def htmlReportStart(outfile, bugId):
+    'Write the start of an HTML report, up to the opening body tag.'
     doc, tag, text = Doc().tagtext()
     doc.asis('<!DOCTYPE html>')
-    with tag('html'):
-        with tag('head'):
-            doc.stag('meta', charset='utf-8')
-            with tag('title'):
-                text(bugId)
-            doc.stag('link',
-                     href='https://fonts.googleapis.com/icon?family=Material+Icons|Source+Code+Pro|Sorce+Sans+Pro',
-                     rel='stylesheet')
-            doc.asis(reportCSS())
-        with tag('body'):
-            doc.asis(head)
-            if isinstance(content, list):
-                for line in content:
-                    doc.asis(line)
-            else:
-                doc.asis(content)
-        doc.asis(reportFooter())
-    return doc.getvalue()
+    doc.asis('<html>')
+    with tag('head'):
+        doc.stag('meta', charset='utf-8')
+        with tag('title'):
+            text(bugId)
+        doc.stag('link',
+                 href='https://fonts.googleapis.com/icon?family=Material+Icons|Source+Code+Pro|Sorce+Sans+Pro',
+                 rel='stylesheet')
+        doc.asis(reportCSS())
+    doc.asis('<body>')
+    outfile.write(doc.getvalue())
+
+
+def htmlReportEnd(outfile):
+    'Write the end of an HTML report.'
+    doc = Doc()
+    doc.asis('</body>')
+    doc.asis(reportFooter())
+    doc.asis('</html>')
+    outfile.write(doc.getvalue())
 
 
 def reportCommitMeta(commit, author, klass):
@@ -826,7 +1447,7 @@ def reportCommitHeader(commit, replaced, meta, commitmap):
         with tag('div'):
             with tag('p', style='text-align:center'):
                 text('Replaces content from the following commits')
-        for r in replaced:
+        for r in sorted(replaced):
             doc.asis(reportReplacedMeta(meta[r]['commit'],
                                         meta[r]['author'],
                                         meta[r]['date'],
@@ -847,27 +1468,26 @@ def reportCommitFile(filename, diffcontent):
     return doc.getvalue()
 
 
-def reportDiffLine(codeline):
+def reportDiffLine(doc, codeline):
     'Generte a diff line of report.'
-    doc, tag, text = Doc().tagtext()
+    tag, text = doc.tag, doc.text
     with tag('tr'):
         with tag('td', klass='diff-code diff-code-inner diff-code-hunk'):
             pass
         with tag('td', colspan='3',
                  klass='diff-code diff-code-inner diff-code-hunk'):
-            text(codeline[2])
-    return doc.getvalue()
+            text(codeline.text)
 
 
-def reportDiffSameLine(codeline):
+def reportDiffSameLine(doc, codeline):
     'Generate a diff line where content is the same of report.'
-    doc, tag, text, line = Doc().ttl()
+    tag, text, line = doc.tag, doc.text, doc.line
     with tag('tr'):
         with tag('td', klass='diff-line-num'):
             with tag('div', klass='num-left'):
-                text(codeline[1][0])
+                text(codeline.old_no)
             with tag('div', klass='num-right'):
-                text(codeline[1][1])
+                text(codeline.new_no)
         with tag('td', klass='diff-commit'):
             pass
         with tag('td', klass='diff-author'):
@@ -878,25 +1498,24 @@ def reportDiffSameLine(codeline):
                      klass='material-icons',
                      style='vertical-align: middle; font-size:14px;')
             with tag('span', klass='diff-code-inner'):
-                text(codeline[2])
-    return doc.getvalue()
+                text(' ' + codeline.text)
 
 
-def reportDiffPlusLine(codeline, blame, commit_map):
+def reportDiffPlusLine(doc, codeline, blame, commit_map):
     'Generate a diff line for a + commit of report.'
-    doc, tag, text, line = Doc().ttl()
-    commit = blame.get(str(codeline[1]), {})\
+    tag, text, line = doc.tag, doc.text, doc.line
+    commit = blame.get(str(codeline.new_no), {})\
                   .get('commit', 'ERR')
-    author = blame.get(str(codeline[1]), {})\
+    author = blame.get(str(codeline.new_no), {})\
                   .get('author', 'ERR')
     with tag('tr'):
         with tag('td', klass='diff-line-num'):
             with tag('div', klass='num-left'):
                 pass
             with tag('div', klass='num-right'):
-                text(codeline[1])
+                text(codeline.new_no)
         with tag('td', klass='diff-commit ' + commit_map.get(commit, '')):
-            text(commit)
+            text(commit[:10])
         with tag('td', klass='diff-author ' + commit_map.get(commit, '')):
             text(author)
         with tag('td', klass='diff-code ' + commit_map.get(commit, '')):
@@ -906,21 +1525,20 @@ def reportDiffPlusLine(codeline, blame, commit_map):
                      style='vertical-align: middle; font-size:14px;')
                 #  text('-')  # reversed because of diff comparison
             with tag('span', klass='diff-code-inner'):
-                text(codeline[2])
-    return doc.getvalue()
+                text(' ' + codeline.text)
 
 
-def reportDiffMinusLine(codeline, commit, author, commit_map):
+def reportDiffMinusLine(doc, codeline, commit, author, commit_map):
     'Generate a diff line or a - commit of report.'
-    doc, tag, text, line = Doc().ttl()
+    tag, text, line = doc.tag, doc.text, doc.line
     with tag('tr'):
         with tag('td', klass='diff-line-num'):
             with tag('div', klass='num-left'):
-                text(codeline[1])
+                text(codeline.old_no)
             with tag('div', klass='num-right'):
                 pass
         with tag('td', klass='diff-commit ' + commit_map[commit]):
-            text(commit)
+            text(commit[:10])
         with tag('td', klass='diff-author ' + commit_map[commit]):
             text(author)
         with tag('td', klass='diff-code ' + commit_map[commit]):
@@ -930,14 +1548,17 @@ def reportDiffMinusLine(codeline, commit, author, commit_map):
                      style='vertical-align: middle; font-size:14px;')
                 # text('+')  # reversed because of diff comparison
             with tag('span', klass='diff-code-inner'):
-                text(codeline[2])
-    return doc.getvalue()
+                text(' ' + codeline.text)
 
 
-def reportDiff(diff, blame, author, commit, commitmap):
-    'Generate the diff section of report.'
-    doc, tag, text, line = Doc().ttl()
+def reportDiff(outfile, diff, blame, author, commit, commitmap):
+    '''Write the diff section of report.
+
+    Each file is rendered into its own builder and written to outfile as
+    soon as it is complete.
+    '''
     for filename in diff:
+        doc, tag, text, line = Doc().ttl()
         with tag('div', klass='file'):
             with tag('div', klass='file-header'):
                 with tag('div', klass='file-info'):
@@ -952,26 +1573,25 @@ def reportDiff(diff, blame, author, commit, commitmap):
                         fileitem = diff[filename]
                         fileblame = blame.get(filename, {})
                         for item in fileitem:
-                            if item[0] == 'diff' or item[0] == 'i' or \
-                               item[0] == '---' or item[0] == '+++' or \
-                               item[0] == 'd':
+                            if item.kind == 'header':
                                 pass  # skip these entries
-                            elif item[0] == '@':
-                                doc.asis(reportDiffLine(item))
-                            elif item[0] == '=':
-                                doc.asis(reportDiffSameLine(item))
-                            elif item[0] == '+':
-                                doc.asis(reportDiffPlusLine(item,
-                                                            fileblame,
-                                                            commitmap))
-                            elif item[0] == '-':
-                                doc.asis(reportDiffMinusLine(item,
-                                                             commit,
-                                                             author,
-                                                             commitmap))
+                            elif item.kind in ('@', 'rename', 'binary',
+                                               'nonewline'):
+                                reportDiffLine(doc, item)
+                            elif item.kind == '=':
+                                reportDiffSameLine(doc, item)
+                            elif item.kind == '+':
+                                reportDiffPlusLine(doc, item,
+                                                   fileblame,
+                                                   commitmap)
+                            elif item.kind == '-':
+                                reportDiffMinusLine(doc, item,
+                                                    commit,
+                                                    author,
+                                                    commitmap)
                             else:
                                 print('MISSED: {}'.format(item))
-    return doc.getvalue()
+        outfile.write(doc.getvalue())
 
 
 def extendCommitSet(commit, blame, commits, committree):
@@ -1012,7 +1632,7 @@ def extendCommitMap(commit, commits, commitmap, index=0):
     localmap = commitmap.copy()
     # override mapping for major commits
     localmap[commit] = 'commit-0'
-    for c in commits:
+    for c in sorted(commits):
         if c not in localmap:
             localmap[c] = mapping[count]
             count += 1
@@ -1021,25 +1641,49 @@ def extendCommitMap(commit, commits, commitmap, index=0):
     return((localmap, count))
 
 
-def createReport(bugId, jira, outfile):
-    'Create the report.'
-    issue = jira.issue(bugId)
-    reportcontent = []
-    commitcontent = []
+def analyzeCommits(commits, cache=None, jobs=1):
+    '''Collect the diff and blame of each commit.
+
+    Returns (commit, diff, blame) tuples in the order of commits.  With more
+    than one job, git runs for different commits and files concurrently.
+    '''
+    if jobs > 1:
+        with ThreadPoolExecutor(max_workers=jobs) as executor:
+            diffs = list(executor.map(lambda c: GitDiff(c, cache), commits))
+            blames = GitBlame.loadBatch([(c, d.getContent())
+                                         for c, d in zip(commits, diffs)],
+                                        cache, executor)
+    else:
+        diffs = [GitDiff(c, cache) for c in commits]
+        blames = GitBlame.loadBatch([(c, d.getContent())
+                                     for c, d in zip(commits, diffs)],
+                                    cache)
+    return list(zip(commits, diffs, blames))
+
+
+def analyzeBug(bugId, cache=None, jobs=1, log=None, commitmeta=None):
+    '''Analyze the commits which fixed a bug.
+
+    Returns (analysis, committree, commitmap, commitmeta), where analysis is
+    the list of (commit, diff, blame) tuples of the fix commits.  log is the
+    GitLog of the bug when it is already known.  commitmeta is a dictionary
+    of commit metadata which is shared between bugs and extended with the
+    commits of this one.
+    '''
     maincommits = set()  # commits to use for header overview
     commits = set()  # set of all commits
     committree = {}  # main commits with commits replaced
     commitmap = {}
-    commitmeta = {}
     mapindex = 0
-    log = GitLog.logBug(bugId)
+    if log is None:
+        log = GitLog.logBug(bugId)
+    if commitmeta is None:
+        commitmeta = {}
     logcontent = log.getContent()
-    for entry in logcontent:
-        commit = entry['commit']
+    analysis = analyzeCommits([entry['commit'] for entry in logcontent],
+                              cache, jobs)
+    for commit, diff, blame in analysis:
         maincommits.add(commit)
-        commitmeta[commit] = GitMeta(commit).getContent()
-        diff = GitDiff(commit)
-        blame = GitBlame(commit, diff.getContent())
         commits, committree = extendCommitSet(commit,
                                               blame.content,
                                               commits,
@@ -1048,55 +1692,463 @@ def createReport(bugId, jira, outfile):
                                               commits,
                                               commitmap,
                                               mapindex)
-        #  build meta info for replaced commits
-        for replaced in committree[commit]:
-            if replaced not in commitmeta:
-                commitmeta[replaced] = GitMeta(replaced).getContent()
-        commitcontent.append(reportCommitHeader(commit,
-                                                committree[commit],
-                                                commitmeta,
-                                                commitmap))
-        commitcontent.append(reportDiff(diff.content,
-                                        blame.content,
-                                        commitmeta[commit]['author'],
-                                        commit,
-                                        commitmap))
-    reportcontent.extend(commitcontent)
-    report = htmlReport(bugId,
-                        reportHeader(bugId, issue),
-                        reportcontent)
-    outfile.write(report)
+    #  build meta info for the main and replaced commits in one pass
+    metacommits = []
+    for commit, diff, blame in analysis:
+        metacommits.append(commit)
+        metacommits.extend(sorted(committree[commit]))
+    commitmeta.update(GitMeta.loadBatch([c for c in metacommits
+                                         if c not in commitmeta], cache))
+    return (analysis, committree, commitmap, commitmeta)
+
+
+def createReport(bugId, issues, outfile, cache=None, jobs=1, log=None,
+                 commitmeta=None):
+    '''Create the report.
+
+    issues is the JiraIssues used to fetch the issue while git runs.  See
+    analyzeBug for log and commitmeta.
+    '''
+    issue = issues.fetch(bugId)
+    analysis, committree, commitmap, commitmeta = analyzeBug(bugId, cache,
+                                                             jobs, log,
+                                                             commitmeta)
+    htmlReportStart(outfile, bugId)
+    outfile.write(reportHeader(bugId, issue.result()))
+    for commit, diff, blame in analysis:
+        outfile.write(reportCommitHeader(commit,
+                                         committree[commit],
+                                         commitmeta,
+                                         commitmap))
+        reportDiff(outfile,
+                   diff.content,
+                   blame.content,
+                   commitmeta[commit]['author'],
+                   commit,
+                   commitmap)
+    htmlReportEnd(outfile)
+
+
+class RecordWriter:
+    '''Write the records of an analysis as JSON while they are produced.
+
+    With the 'ndjson' format every record is written on a line of its own,
+    with 'json' the records are the items of a single JSON array.
+    '''
+
+    def __init__(self, outfile, fmt='ndjson'):
+        self.outfile = outfile
+        self.fmt = fmt
+        self.count = 0
+
+    def write(self, record):
+        data = json.dumps(record, sort_keys=True)
+        if self.fmt == 'json':
+            data = ('[\n' if self.count == 0 else ',\n') + data
+        else:
+            data = data + '\n'
+        self.outfile.write(data)
+        self.count += 1
+
+    def close(self):
+        if self.fmt == 'json':
+            self.outfile.write('[\n]\n' if self.count == 0 else '\n]\n')
+
+
+def issueRecord(bugId, issue):
+    'Return the record of a JIRA issue.'
+    fields = issue.fields
+    return {'type': 'bug',
+            'bug': bugId,
+            'summary': fields.summary,
+            'issuetype': fields.issuetype.name,
+            'status': fields.status.name,
+            'resolution': fields.resolution.name if fields.resolution else None,
+            'versions': [x.name for x in fields.versions],
+            'fixVersions': [x.name for x in fields.fixVersions],
+            'components': [x.name for x in fields.components or []],
+            'labels': list(fields.labels)}
+
+
+def commitRecord(kind, bugId, meta):
+    'Return the record of a commit from its metadata.'
+    notes = meta.get('notes', [])
+    date = meta.get('date')
+    return {'type': kind,
+            'bug': bugId,
+            'commit': meta.get('commit'),
+            'author': meta.get('author'),
+            'email': meta.get('email'),
+            'date': date.isoformat() if date else None,
+            'title': notes[1].strip() if len(notes) > 1 else '',
+            'bugs': meta.get('bug', [])}
+
+
+def exportReport(bugId, issues, writer, cache=None, jobs=1, log=None,
+                 commitmeta=None):
+    '''Write the analysis of a bug as records to a RecordWriter.
+
+    The records are, in order:
+    - 'bug' with the JIRA fields of the bug
+    - for every fix commit a 'commit' record listing the commits whose
+      lines it replaced, a 'file' record for every file of its diff with
+      [kind, old_no, new_no, text] lines and a 'blame' record for every
+      replaced line
+    - an 'origin' record with the metadata of every replaced commit
+    '''
+    issue = issues.fetch(bugId)
+    analysis, committree, commitmap, commitmeta = analyzeBug(bugId, cache,
+                                                             jobs, log,
+                                                             commitmeta)
+    writer.write(issueRecord(bugId, issue.result()))
+    origins = set()
+    for commit, diff, blame in analysis:
+        record = commitRecord('commit', bugId, commitmeta[commit])
+        record['commit'] = commit
+        record['replaces'] = sorted(committree[commit])
+        writer.write(record)
+        origins.update(committree[commit])
+        for filename in diff.content:
+            writer.write({'type': 'file',
+                          'bug': bugId,
+                          'commit': commit,
+                          'file': filename,
+                          'lines': [[item.kind, item.old_no, item.new_no,
+                                     item.text]
+                                    for item in diff.content[filename]]})
+        for filename in blame.content:
+            for line in sorted(blame.content[filename], key=int):
+                found = blame.content[filename][line]
+                writer.write({'type': 'blame',
+                              'bug': bugId,
+                              'commit': commit,
+                              'file': filename,
+                              'line': int(line),
+                              'origin': found['commit'],
+                              'author': found['author'],
+                              'date': found['date']})
+    for origin in sorted(origins):
+        record = commitRecord('origin', bugId, commitmeta[origin])
+        record['commit'] = origin
+        writer.write(record)
+
+
+def createReports(bugIds, issues, outdir, cache=None, jobs=1, index=None,
+                  fmt='html'):
+    '''Create a report for each bug in outdir.
+
+    The history is walked once for all bugs and the metadata of commits
+    shared by several bugs is only loaded once.  The JIRA issues are
+    fetched in batches while git runs.
+    '''
+    issues.prefetch(bugIds)
+    logs = GitLog.logBugs(bugIds, index)
+    commitmeta = {}
+    for bugId in bugIds:
+        filename = os.path.join(outdir, bugId + '.' + fmt)
+        with open(filename, 'w') as outfile:
+            if fmt == 'html':
+                createReport(bugId, issues, outfile, cache, jobs,
+                             logs[bugId], commitmeta)
+            else:
+                writer = RecordWriter(outfile, fmt)
+                exportReport(bugId, issues, writer, cache, jobs,
+                             logs[bugId], commitmeta)
+                writer.close()
+
+
+def exportReports(bugIds, issues, writer, cache=None, jobs=1, index=None):
+    '''Write the records of several bugs to a single RecordWriter.'''
+    issues.prefetch(bugIds)
+    logs = GitLog.logBugs(bugIds, index)
+    commitmeta = {}
+    for bugId in bugIds:
+        exportReport(bugId, issues, writer, cache, jobs, logs[bugId],
+                     commitmeta)
+
+
+class OriginStore:
+    '''Persistent store of the origins of defects across many bugs.
+
+    For every analyzed bug the store keeps the number of lines each fix
+    commit replaced per origin commit and file, together with the metadata
+    of the commits.  It is a SQLite database inside the .git directory, so
+    bugs are analyzed once and the rankings are answered by queries.
+    '''
+
+    top_columns = {'commits': 'origins.origin',
+                   'authors': 'commits.author',
+                   'files': 'origins.file'}
+
+    def __init__(self, path=None):
+        if not path:
+            path = os.path.join(gitDir(), ORIGINS_FILE)
+        self.db = sqlite3.connect(path)
+        self.db.execute('''CREATE TABLE IF NOT EXISTS bugs (
+                             bug TEXT PRIMARY KEY,
+                             fixes INTEGER NOT NULL,
+                             analyzed REAL NOT NULL)''')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS origins (
+                             bug TEXT NOT NULL,
+                             fix TEXT NOT NULL,
+                             origin TEXT NOT NULL,
+                             file TEXT NOT NULL,
+                             lines INTEGER NOT NULL)''')
+        self.db.execute('''CREATE TABLE IF NOT EXISTS commits (
+                             commit_id TEXT PRIMARY KEY,
+                             author TEXT,
+                             email TEXT,
+                             date TEXT,
+                             title TEXT)''')
+        self.db.execute('''CREATE INDEX IF NOT EXISTS origins_bug
+                           ON origins (bug)''')
+        self.db.execute('''CREATE INDEX IF NOT EXISTS origins_origin
+                           ON origins (origin, bug)''')
+        self.db.execute('''CREATE INDEX IF NOT EXISTS origins_file
+                           ON origins (file, bug)''')
+
+    def known(self, bugIds):
+        'Return the set of bugIds which are already in the store.'
+        found = set()
+        for bugId in bugIds:
+            if self.db.execute('SELECT 1 FROM bugs WHERE bug = ?',
+                               (bugId,)).fetchone():
+                found.add(bugId)
+        return found
+
+    def add(self, bugId, analysis, commitmeta):
+        '''Store the origins of a bug from the result of analyzeBug.
+
+        A bug which is already in the store is replaced.
+        '''
+        counts = {}
+        for commit, diff, blame in analysis:
+            for filename in blame.content:
+                for found in blame.content[filename].values():
+                    key = (commit, found['commit'], filename)
+                    counts[key] = counts.get(key, 0) + 1
+        commits = set(commit for commit, diff, blame in analysis)
+        commits.update(origin for fix, origin, filename in counts)
+        self.db.execute('DELETE FROM origins WHERE bug = ?', (bugId,))
+        self.db.executemany('INSERT INTO origins '
+                            '(bug, fix, origin, file, lines) '
+                            'VALUES (?, ?, ?, ?, ?)',
+                            [(bugId, fix, origin, filename, lines)
+                             for (fix, origin, filename), lines
+                             in counts.items()])
+        self.db.executemany('INSERT OR REPLACE INTO commits '
+                            '(commit_id, author, email, date, title) '
+                            'VALUES (?, ?, ?, ?, ?)',
+                            [OriginStore._commit_row(commit,
+                                                     commitmeta.get(commit,
+                                                                    {}))
+                             for commit in sorted(commits)])
+        self.db.execute('INSERT OR REPLACE INTO bugs (bug, fixes, analyzed) '
+                        'VALUES (?, ?, ?)',
+                        (bugId, len(analysis), time.time()))
+        self.db.commit()
+
+    def _commit_row(commit, meta):
+        record = commitRecord('commit', None, meta)
+        return (commit, record['author'], record['email'], record['date'],
+                record['title'])
+
+    def top(self, kind, limit=DEFAULT_TOP_LIMIT):
+        '''Return the origins which caused the most bugs.
+
+        kind is one of 'commits', 'authors' or 'files'.  Returns (name, bugs,
+        lines) rows ordered by the number of bugs, then of replaced lines.
+        '''
+        column = OriginStore.top_columns[kind]
+        join = ''
+        if kind == 'authors':
+            join = 'JOIN commits ON commits.commit_id = origins.origin'
+        return self.db.execute('SELECT %s, COUNT(DISTINCT origins.bug), '
+                               'SUM(origins.lines) FROM origins %s '
+                               'GROUP BY 1 ORDER BY 2 DESC, 3 DESC, 1 '
+                               'LIMIT ?' % (column, join),
+                               (limit,)).fetchall()
+
+    def getSummary(self):
+        count = self.db.execute('SELECT COUNT(*) FROM bugs').fetchone()[0]
+        return 'origins: %d bugs' % count
+
+    def close(self):
+        self.db.close()
+
+
+def aggregateOrigins(bugIds, store, cache=None, jobs=1, index=None,
+                     refresh=False):
+    '''Add the origins of bugs to an OriginStore.
+
+    Bugs already in the store are skipped unless refresh is set, so the
+    store can be kept up to date by passing the bugs closed since the last
+    run, or simply all of them again.  The history is walked once for all
+    new bugs.
+    '''
+    if not refresh:
+        known = store.known(bugIds)
+        bugIds = [bugId for bugId in bugIds if bugId not in known]
+    if not bugIds:
+        return
+    logs = GitLog.logBugs(bugIds, index)
+    commitmeta = {}
+    for bugId in bugIds:
+        analysis, committree, commitmap, commitmeta = analyzeBug(
+            bugId, cache, jobs, logs[bugId], commitmeta)
+        store.add(bugId, analysis, commitmeta)
+
+
+def reportTop(outfile, kind, rows, fmt='html'):
+    '''Write a ranking of OriginStore.top.
+
+    The ranking is an HTML page, a tab separated table with tsv, or records
+    with the json formats.
+    '''
+    if fmt == 'tsv':
+        outfile.write('bugs\tlines\t%s\n' % kind[:-1])
+        for name, bugs, lines in rows:
+            outfile.write('%d\t%d\t%s\n' % (bugs, lines, name))
+        return
+    if fmt == 'html':
+        title = 'Top {} by bugs caused'.format(kind)
+        htmlReportStart(outfile, title)
+        doc, tag, text, line = Doc().ttl()
+        with tag('h1'):
+            text(title)
+        with tag('table'):
+            with tag('tr'):
+                line('th', 'bugs')
+                line('th', 'lines')
+                line('th', kind[:-1])
+            for name, bugs, lines in rows:
+                with tag('tr'):
+                    line('td', str(bugs))
+                    line('td', str(lines))
+                    line('td', name)
+        outfile.write(doc.getvalue())
+        htmlReportEnd(outfile)
+        return
+    writer = RecordWriter(outfile, fmt)
+    for name, bugs, lines in rows:
+        writer.write({'type': 'top',
+                      'kind': kind[:-1],
+                      'name': name,
+                      'bugs': bugs,
+                      'lines': lines})
+    writer.close()
+
+
+def readBugIds(bugfile, projects=None):
+    '''Return the bug IDs listed in a file.
+
+    The file lists one ID per line or per field, separated by commas, tabs,
+    semicolons or bars, so exports of a JQL search can be used as they are.
+    Only fields which are a bug ID as a whole are used, so IDs mentioned in
+    summaries or names like charset=UTF-8 are not picked up.  When projects
+    are given only IDs of these project keys are used.
+    '''
+    keys = [key.upper() for key in projects or []]
+    bugIds = []
+    for line in bugfile:
+        for field in BUG_FILE_SEPARATORS.split(line):
+            field = field.strip(' \r\n"\'')
+            if not BUG_ID_PATTERN.fullmatch(field):
+                continue
+            if keys and field.rpartition('-')[0].upper() not in keys:
+                continue
+            if field not in bugIds:
+                bugIds.append(field)
+    return bugIds
 
 
 def connectToJira(url, timeout):
     'Attempt a connection to JIRA. Returns None on failure.'
     jira_options = {
-        'server': JIRA_URL
+        'server': url
     }
 
     try:
-        jira = JIRA(jira_options, validate=True, timeout=timeout)
-    except JIRAError as e:
-        if e.status_code == 401:
-            sys.stderr.write(textwrap.dedent('''
-            Failed to authenticate to JIRA.
-
-            JIRA responded with:
-            {}
-
-            Please check that you have added your credentials to your
-            ~/.netrc file.
-            ''').format(e.text))
-        else:
-            sys.stderr.write(textwrap.dedent('''
-            Failed to connect to JIRA.
-
-            {}
-            ''').format(e.text))
+        jira = JIRA(jira_options, validate=False, get_server_info=False,
+                    timeout=timeout)
+    except (JIRAError, RequestException) as e:
+        jiraFailed(e)
         jira = None
     return jira
 
 
+def jiraFailed(error):
+    '''Explain why JIRA information could not be loaded.
+
+    The client only talks to JIRA once issues are fetched, so this is used
+    for the errors of the fetches as well as of the connection.
+    '''
+    if isinstance(error, JIRAError) and error.status_code == 401:
+        sys.stderr.write(textwrap.dedent('''
+        Failed to authenticate to JIRA.
+
+        JIRA responded with:
+        {}
+
+        Please check that you have added your credentials to your
+        ~/.netrc file.
+        ''').format(error.text))
+    elif isinstance(error, JIRAError):
+        sys.stderr.write(textwrap.dedent('''
+        Failed to connect to JIRA.
+
+        {}
+        ''').format(error.text))
+    elif isinstance(error, JiraCacheMiss):
+        sys.stderr.write(textwrap.dedent('''
+        {}.
+
+        Run again without --jira-cache-only to fetch it.
+        ''').format(error))
+    else:
+        sys.stderr.write(textwrap.dedent('''
+        Failed to connect to JIRA.
+
+        {}
+        ''').format(error))
+
+
+@contextmanager
+def openRun(args, jira=None, issues=False, store=False, index=False):
+    '''Open the caches, index and stores a run uses and close them after.
+
+    Yields a namespace with cache, issues, store and index, the ones not
+    asked for being None.  When the run succeeds the summaries of the caches
+    and of the git processes are written to stderr.
+    '''
+    run = argparse.Namespace(cache=None, issues=None, store=None, index=None)
+    try:
+        run.cache = ReportCache(max_size=args.cache_size * 1024 * 1024,
+                                enabled=args.cache,
+                                rebuild=args.rebuild_cache)
+        if issues:
+            run.issues = JiraIssues(jira, ttl=args.jira_ttl,
+                                    enabled=args.cache)
+        if store:
+            run.store = OriginStore()
+        if index and args.index:
+            run.index = BugIndex()
+            run.index.update()
+        yield run
+        if run.store:
+            sys.stderr.write(run.store.getSummary() + '\n')
+    finally:
+        for opened in (run.issues, run.index, run.cache, run.store):
+            if opened:
+                opened.close()
+        GitObjects.shared().close()
+    if args.cache:
+        sys.stderr.write(run.cache.getSummary() + '\n')
+        if run.issues:
+            sys.stderr.write(run.issues.getSummary() + '\n')
+    sys.stderr.write(GitProcesses.getSummary() + '\n')
+
+
 if __name__ == "__main__":
     description = textwrap.dedent('''
     Generate bug report useful for reviewing Root Cause and origin of
@@ -1105,6 +2157,20 @@ if __name__ == "__main__":
     Report is generated as an HTML file either to standard out or to a file
     as specified with program arguments.
 
+    Several bugs can be given at once, on the command line or in a file
+    with --bug-file.  The history is then walked only once and one report
+    per bug is written to the directory given with --output-dir.
+
+    With --format json or ndjson the analysis is written as JSON records
+    instead of HTML, for use by other tools.  The records of several bugs
+    can then also go to a single output.
+
+    With --aggregate the origins of the bugs, the commits whose lines their
+    fixes replaced, are added to a store in the .git directory instead.
+    Bugs which are already in the store are skipped, so the same list can
+    be passed again as bugs get closed.  --top then ranks the commits,
+    authors or files which caused the most bugs from the store.
+
     This utilitiy is expected to be run from within the git directory of the
     associated project at the top level.
 
@@ -1120,12 +2186,30 @@ if __name__ == "__main__":
         prog=PROG,
         formatter_class=argparse.RawDescriptionHelpFormatter,
         description=description)
-    parser.add_argument('bug', action='store',
+    parser.add_argument('bug', action='store', nargs='*',
                         help='''JIRA ID for issue''')
+    parser.add_argument('-b', '--bug-file',
+                        type=argparse.FileType('r'),
+                        dest='bug_file',
+                        help='File listing JIRA IDs, for example the '
+                             'export of a JQL search')
+    parser.add_argument('-p', '--project', action='append',
+                        dest='projects',
+                        help='Only use IDs of this JIRA project key from '
+                             '--bug-file; may be given several times')
     parser.add_argument('-o', '--output',
                         nargs='?', type=argparse.FileType('w'),
                         default=sys.stdout,
                         help='Name of output file')
+    parser.add_argument('-f', '--format', action='store',
+                        dest='format',
+                        choices=['html', 'json', 'ndjson', 'tsv'],
+                        default='html',
+                        help='Format of the output, html by default; tsv '
+                             'is only available with --top')
+    parser.add_argument('-d', '--output-dir', action='store',
+                        dest='output_dir',
+                        help='Directory for the reports of several bugs')
     parser.add_argument('--timeout', type=int, action='store',
                         dest='timeout',
                         default=DEFAULT_TIMEOUT,
@@ -1134,12 +2218,105 @@ if __name__ == "__main__":
                         dest='url',
                         default=JIRA_URL,
                         help='URL of JIRA server')
+    parser.add_argument('--jira-ttl', type=int, action='store',
+                        dest='jira_ttl',
+                        default=DEFAULT_JIRA_TTL,
+                        help='Seconds to keep JIRA issues in the cache.')
+    parser.add_argument('--jira-cache-only', action='store_true',
+                        dest='jira_cache_only',
+                        help='Do not connect to JIRA; only use issues '
+                             'from the cache.')
+    parser.add_argument('-j', '--jobs', type=int, action='store',
+                        dest='jobs',
+                        default=1,
+                        help='Number of git commands to run concurrently.')
+    parser.add_argument('--no-cache', action='store_false',
+                        dest='cache',
+                        help='Do not use the caches of git results and '
+                             'JIRA issues.')
+    parser.add_argument('--rebuild-cache', action='store_true',
+                        dest='rebuild_cache',
+                        help='Discard the cache of git results and '
+                             'rebuild it.')
+    parser.add_argument('--cache-size', type=int, action='store',
+                        dest='cache_size',
+                        default=DEFAULT_CACHE_SIZE,
+                        help='Maximum size of the cache in megabytes.')
+    parser.add_argument('--no-index', action='store_false',
+                        dest='index',
+                        help='Search the history instead of using the '
+                             'index of bug IDs kept in the .git directory.')
+    parser.add_argument('--aggregate', action='store_true',
+                        dest='aggregate',
+                        help='Add the origins of the bugs to the store of '
+                             'defect origins instead of writing reports.')
+    parser.add_argument('--refresh', action='store_true',
+                        dest='refresh',
+                        help='With --aggregate, analyze again bugs which '
+                             'are already in the store.')
+    parser.add_argument('--top', action='store',
+                        dest='top',
+                        choices=sorted(OriginStore.top_columns),
+                        help='Rank the commits, authors or files which '
+                             'caused the most bugs in the store.')
+    parser.add_argument('--limit', type=int, action='store',
+                        dest='limit',
+                        default=DEFAULT_TOP_LIMIT,
+                        help='Number of entries ranked by --top.')
     parser.add_argument('--version', action='version',
                         version='%(prog)s ' + VERSION)
     args = parser.parse_args()
+    bugIds = list(args.bug)
+    if args.bug_file:
+        bugIds.extend([bugId for bugId in readBugIds(args.bug_file,
+                                                  args.projects)
+                       if bugId not in bugIds])
+    if not bugIds and not args.top:
+        parser.error('no JIRA ID given')
+    if bugIds and args.top and not args.aggregate:
+        parser.error('JIRA IDs can only be given to --top with --aggregate')
+    if args.aggregate or args.top:
+        if args.output_dir:
+            parser.error('--output-dir can not be used with --aggregate '
+                         'or --top')
+    elif len(bugIds) > 1 and not args.output_dir and args.format == 'html':
+        parser.error('--output-dir is required for several JIRA IDs')
+
+    if args.format == 'tsv' and not args.top:
+        parser.error('--format tsv can only be used with --top')
+    if args.jira_cache_only and not args.cache:
+        parser.error('--jira-cache-only can not be used with --no-cache')
+
+    if args.aggregate or args.top:
+        with openRun(args, store=True, index=args.aggregate) as run:
+            if args.aggregate:
+                aggregateOrigins(bugIds, run.store, run.cache, args.jobs,
+                                 run.index, args.refresh)
+            if args.top:
+                reportTop(args.output, args.top,
+                          run.store.top(args.top, args.limit), args.format)
+        sys.exit(0)
+
+    jira = None
+    if not args.jira_cache_only:
+        jira = connectToJira(args.url, args.timeout)
+        if not jira:
+            sys.exit(1)
 
-    jira = connectToJira(JIRA_URL, args.timeout)
-    if not jira:
+    try:
+        with openRun(args, jira, issues=True, index=True) as run:
+            if args.output_dir:
+                os.makedirs(args.output_dir, exist_ok=True)
+                createReports(bugIds, run.issues, args.output_dir, run.cache,
+                              args.jobs, run.index, args.format)
+            elif args.format != 'html':
+                writer = RecordWriter(args.output, args.format)
+                exportReports(bugIds, run.issues, writer, run.cache, args.jobs,
+                              run.index)
+                writer.close()
+            else:
+                createReport(bugIds[0], run.issues, args.output, run.cache,
+                             args.jobs, GitLog.logBug(bugIds[0], run.index))
+    except (JIRAError, RequestException, JiraCacheMiss) as e:
+        jiraFailed(e)
         sys.exit(1)
-
-    createReport(args.bug, jira, args.output)